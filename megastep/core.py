@@ -104,7 +104,7 @@ class Core:
                             model       Tensor((8, 2, 2), torch.float32)
                             lines       Tensor((307, 2, 2), torch.float32)
                             lights      Tensor((21, 3), torch.float32)
-                            textures    <megastepcuda.Ragged2D object at 0x7fba34112eb0>
+                            textures    <megastepcuda.Ragged2DU8 object at 0x7fba34112eb0>
                             baked       <megastepcuda.Ragged1D object at 0x7fba34112670>
             agents          arrdict:
                             angles       Tensor((4,), torch.float32)
@@ -2,13 +2,18 @@ from io import BytesIO
 import logging
 import requests
 from tqdm.auto import tqdm
-from zipfile import ZipFile
+from zipfile import ZipFile, ZIP_STORED
 import pandas as pd
 from pathlib import Path
 import gzip
+import shutil
+import json
 import numpy as np
 from rebar import parallel, dotdict
-import ast
+import re
+import struct
+import os
+import tempfile
 from pkg_resources import resource_filename
 from pathlib import Path
 
@@ -83,6 +88,15 @@ def cubicasa5k():
     return str(p)
 
 def svg_data(regenerate=False):
+    # Pickled copy of the .json.gz, since read_json is slow
+    pickled = Path('.cache/cubicasa-svgs.pkl')
+    if pickled.exists() and not regenerate:
+        try:
+            return pd.read_pickle(pickled)
+        except Exception:
+            # Pickles aren't always readable across pandas versions, but it can always be rebuilt from the JSON
+            log.warning(f'Couldn\'t read {pickled}, rebuilding it from the JSON')
+
     p = Path('.cache/cubicasa-svgs.json.gz')
     if not p.exists() or regenerate:
         p.parent.mkdir(exist_ok=True, parents=True)
@@ -102,26 +116,36 @@ def svg_data(regenerate=False):
             #TODO: Shift this to Github 
             url = 'https://www.dropbox.com/s/iblduqobhqomz4g/cubicasa-svgs.json.gzip?raw=1'
             p.write_bytes(download(url))
-    return pd.read_json(gzip.decompress(p.read_bytes()))
+
+    svgs = pd.read_json(BytesIO(decompress(p)))
+    # Write-then-rename, so an interrupted save doesn't leave a truncated pickle behind
+    tmp = tempsibling(pickled)
+    svgs.to_pickle(tmp)
+    tmp.replace(pickled)
+    return svgs
 
 def flatten(tree):
+    # Iterative rather than recursive, and joins each path once at the leaf rather than rebuilding the key 
+    # at every level. Children are pushed in reverse so they come off the stack in their original order.
     flat = {}
-    for k, v in tree.items():
+    stack = [((k,), v) for k, v in reversed(list(tree.items()))]
+    while stack:
+        path, v = stack.pop()
         if isinstance(v, dict):
-            for kk, vv in flatten(v).items():
-                flat[f'{k}/{kk}'] = vv
+            stack.extend(((*path, k), vv) for k, vv in reversed(list(v.items())))
         else:
-            flat[k] = v
+            flat['/'.join(path)] = v
     return flat
 
 def unflatten(d):
-    tree = type(d)()
+    cls = type(d)
+    tree = cls()
     for k, v in d.items():
-        parts = k.split('/')
+        *parts, last = k.split('/')
         node = tree
-        for p in parts[:-1]:
-            node = node.setdefault(p, type(d)())
-        node[parts[-1]] = v
+        for p in parts:
+            node = node.setdefault(p, cls())
+        node[last] = v
     return tree
         
 def safe_geometry(id, svg):
@@ -133,20 +157,129 @@ def safe_geometry(id, svg):
         # We'll lose ~8 SVGs to them not having any spaces
         log.info(f'Geometry generation failed on on #{id}')
 
+_HEADER = re.compile(rb"'descr':\s*'([^']+)'.*'shape':\s*\(([^)]*)\)")
+
 def fastload(raw):
     """Most of the time in np.load is spent parsing the header, since it could have a giant mess of record types in
-    it. But we know here that it doesn't! So we can do the parsing with direct slices into the byte array, and skip a
-    bunch of checks.
-    
-    Can push x3 faster than this by writing a regex for the descr and shape, but that's optimizing a bit too hard for 
-    our purposes.
+    it. But we know here that it doesn't! So we can unpack the fixed-size prefix directly, pull the descr and shape 
+    out with a regex, and skip a bunch of checks.
     
     Credit to @pag for pointing this out to me once upon a time"""
-    headerlen = np.frombuffer(raw[8:9], dtype=np.uint8)[0]
-    header = ast.literal_eval(raw[10:10+headerlen].decode())
-    return np.frombuffer(raw[10+headerlen:], dtype=header['descr']).reshape(header['shape'])
+    assert raw[:6] == b'\x93NUMPY', 'Not an npy array'
+    if raw[6] == 1:
+        headerlen, = struct.unpack('<H', raw[8:10])
+        start = 10
+    else:
+        headerlen, = struct.unpack('<I', raw[8:12])
+        start = 12
+    descr, shape = _HEADER.search(raw[start:start+headerlen]).groups()
+    shape = tuple(int(s) for s in shape.split(b',') if s.strip())
+    return np.frombuffer(raw, dtype=descr.decode(), offset=start+headerlen).reshape(shape)
+
+def decompress(p, chunk=128*1024):
+    """Streams the gzip file at ``p`` into memory in large chunks, rather than holding the compressed and decompressed
+    payloads in memory back-to-back like ``gzip.decompress(p.read_bytes())`` does."""
+    bs = BytesIO()
+    with gzip.open(p, 'rb') as f:
+        shutil.copyfileobj(f, bs, length=chunk)
+    return bs.getvalue()
+
+def members(raw):
+    """Yields the name and a zero-copy view of each member of the uncompressed zipfile ``raw``. This avoids the copy 
+    that ``zf.read`` makes of every member."""
+    view = memoryview(raw)
+    with ZipFile(BytesIO(raw)) as zf:
+        for info in zf.infolist():
+            assert info.compress_type == ZIP_STORED, 'Members must be uncompressed to be viewed directly'
+            # The local header's extra field can differ from the central directory's, so read its length from 
+            # the local header itself.
+            offset = info.header_offset
+            namelen, extralen = struct.unpack('<HH', view[offset+26:offset+30])
+            start = offset + 30 + namelen + extralen
+            yield info.filename, view[start:start+info.file_size]
+
+ALIGNMENT = 64
+
+def tempsibling(path):
+    """Creates a uniquely-named empty file in the same directory as ``path``. Writing there and then moving it over 
+    ``path`` means concurrent writers - like several workers loading for the first time - never share a file."""
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f'{path.name}.', suffix='.tmp')
+    os.close(fd)
+    return Path(tmp)
+
+def mmapsave(flat, index, data):
+    """Writes the flat dict of arrays ``flat`` out as one contiguous, cacheline-aligned binary file ``data``, along
+    with a JSON ``index`` of where each array lives in it. The index is written last, so its existence means the 
+    data is complete.
+    
+    Both files are written to temporaries and moved into place, rather than truncated in place. That way any 
+    existing memmaps of the old data - like the ones held by :func:`sample` - keep the old file alive, and an 
+    interrupted save can't leave an index pointing at a partial data file.
+    
+    Returns the saved arrays as views into the new data file, same as :func:`mmapload` would. Going through this 
+    rather than re-reading the index means that another process saving at the same time can't pull the index out
+    from under this one."""
+    try:
+        index.unlink()
+    except FileNotFoundError:
+        pass
+
+    # Lay the arrays out grouped by field - all the walls, then all the lights, etc - so that gathering one field 
+    # across many geometries is a linear scan. The index keeps the original order, so the loaded tree does too.
+    layout = sorted(flat, key=lambda k: k.rsplit('/', 1)[-1])
+    entries, offset = {}, 0
+    tmp = tempsibling(data)
+    with open(tmp, 'wb') as f:
+        for k in layout:
+            # Not `ascontiguousarray`, as that turns 0-d arrays into 1-d ones
+            v = np.require(flat[k], requirements='C')
+            padding = -offset % ALIGNMENT
+            f.write(bytes(padding))
+            offset += padding
+            entries[k] = {'dtype': v.dtype.str, 'shape': v.shape, 'offset': offset}
+            # Write the array's memory directly, rather than via a `tobytes` copy
+            f.write(v.reshape(-1).view(np.uint8))
+            offset += v.nbytes
+    entries = {k: entries[k] for k in flat}
+    # Map the file before it's moved, so these are views of exactly what was just written
+    arrays = views(entries, tmp)
+    tmp.replace(data)
+
+    tmp = tempsibling(index)
+    tmp.write_text(json.dumps(entries))
+    tmp.replace(index)
+
+    return arrays
+
+def mmapload(index, data):
+    """Inverse of :func:`mmapsave`. The arrays are read-only views into a memmap of ``data``, so there's nothing to
+    decompress or parse, and the pages are shared between any processes that load them."""
+    return views(json.loads(index.read_text()), data)
+
+def views(entries, data):
+    mm = np.memmap(data, mode='r')
+    return dotdict.dotdict({
+        k: np.ndarray(e['shape'], e['dtype'], buffer=mm, offset=e['offset']) 
+        for k, e in entries.items()})
+
+def unpack(p, index, data):
+    """Decodes the .npz.gz at ``p`` and re-saves it with :func:`mmapsave`. This is its own function so that the 
+    decompressed payload - and all the arrays viewing it - are freed as soon as it returns, rather than staying
+    alive alongside the memmap that replaces them. Returns the memmapped arrays."""
+    # np.load is kinda slow. 
+    raw = decompress(p)
+    flat = dotdict.dotdict({n[:-4]: fastload(b) for n, b in members(raw)})
+
+    return mmapsave(flat, index, data)
 
 def geometry_data(regenerate=False):
+    # The .npz.gz is what's distributed, but it's slow to decode. So the first time it's loaded, it's re-saved 
+    # as a memmap-able binary file, and that's what's used from then on.
+    index = Path('.cache/cubicasa-geometry.index.json')
+    data = Path('.cache/cubicasa-geometry.data.bin')
+    if index.exists() and data.exists() and not regenerate:
+        return unflatten(mmapload(index, data))
+
     # Why .npz.gz? Because applying gzip manually manages x10 better compression than
     # np.savez_compressed. They use the same compression alg, so I assume the difference
     # is in the default compression setting - which isn't accessible in np.savez_compressec.
@@ -161,19 +294,21 @@ def geometry_data(regenerate=False):
 
             bs = BytesIO()
             np.savez(bs, **gs)
-            p.write_bytes(gzip.compress(bs.getvalue()))
+            # Compress straight from the buffer into the file, rather than holding a compressed copy in memory too.
+            # Level 9 is gzip.compress's default too; it's explicit here since it's what the ratio depends on.
+            with gzip.open(p, 'wb', compresslevel=9) as f:
+                f.write(bs.getbuffer())
+            # Don't hold onto these while the cache is unpacked below
+            del gs, bs
         else:
             #TODO: Shift this to Github 
             url = 'https://www.dropbox.com/s/3ohut8lvmr8lkwg/cubicasa-geometry.npz.gz?raw=1'
             p.write_bytes(download(url))
 
-    # np.load is kinda slow. 
-    raw = gzip.decompress(p.read_bytes())
-    with ZipFile(BytesIO(raw)) as zf:
-        flat = dotdict.dotdict({n[:-4]: fastload(zf.read(n)) for n in zf.namelist()})
-    return unflatten(flat)
+    return unflatten(unpack(p, index, data))
 
 _cache = None
+_orders = {}
 def sample(n_geometries, split='training', seed=1):
     """Returns a random sample of cubicasa :ref:`geometries <geometry>`. 
 
@@ -186,7 +321,8 @@ def sample(n_geometries, split='training', seed=1):
     The geometries are derived from the `Cubicasa5k <https://github.com/CubiCasa/CubiCasa5k>`_ dataset.
 
     The first time you call this function, it'll fetch and cache a ~10MB precomputed geometries file. This is far
-    easier to work with than the full 5GB Cuibcasa5k dataset. If you want to recompute the geometries from scratch
+    easier to work with than the full 5GB Cuibcasa5k dataset. It's then unpacked into a memory-mapped file, which is
+    what's loaded on subsequent runs. If you want to recompute the geometries from scratch
     however, import this module and try calling :: 
     
         svg_data(regenerate=True) 
@@ -206,12 +342,17 @@ def sample(n_geometries, split='training', seed=1):
     confirm()
     global _cache
     if _cache is None:
-        _cache = geometry_data()
-        # Add the ID, since we're going to return this as a list
-        _cache = type(_cache)({k: type(v)({'id': k, **v}) for k, v in _cache.items()})
+        data = geometry_data()
+        # Keep the designs in a list in ID order, so that sampling is just indexing into it. Add the ID to each, 
+        # since we're going to return them as a list
+        _cache = [type(data[k])({'id': k, **data[k]}) for k in sorted(data)]
     
-    cutoff = int(.9*len(_cache))
-    order = np.random.RandomState(seed).permutation(sorted(_cache))
+    # Permuting the IDs gives the same answer every time, so only do it once per seed. Permuting their positions
+    # rather than the IDs themselves gives the same order.
+    if seed not in _orders:
+        _orders[seed] = np.random.RandomState(seed).permutation(len(_cache)).tolist()
+    order = _orders[seed]
+    cutoff = int(.9*len(order))
     if split == 'training':
         order = order[:cutoff]
     elif split == 'test':
@@ -222,3 +363,46 @@ def sample(n_geometries, split='training', seed=1):
         raise ValueError('Split must be train/test/all')
 
     return [_cache[order[i % len(order)]] for i in range(n_geometries)]
+
+def test_fastload():
+    arrays = {
+        'walls': np.random.rand(5, 2, 2),
+        'res': np.array(.02),
+        'empty': np.zeros((0, 2), dtype=np.int32),
+        'bigendian': np.arange(6, dtype='>i4').reshape(2, 3)}
+    bs = BytesIO()
+    np.savez(bs, **arrays)
+
+    # np.savez only writes v2 headers when it has to, so add one by hand
+    arrays['v2'] = np.random.rand(3, 4)
+    v2 = BytesIO()
+    np.lib.format.write_array(v2, arrays['v2'], version=(2, 0))
+    with ZipFile(bs, 'a', compression=ZIP_STORED) as zf:
+        zf.writestr('v2.npy', v2.getvalue())
+
+    loaded = {n[:-4]: fastload(b) for n, b in members(bs.getvalue())}
+    assert list(loaded) == list(arrays)
+    for k, v in arrays.items():
+        assert loaded[k].shape == v.shape
+        assert loaded[k].dtype == v.dtype
+        np.testing.assert_array_equal(loaded[k], v)
+
+def test_mmapsave(tmp_path):
+    flat = {
+        'a/walls': np.random.rand(5, 2, 2),
+        'a/res': np.array(.02),
+        'a/empty': np.zeros((0, 2), dtype=np.int32),
+        'b/walls': np.arange(6, dtype='>f8').reshape(3, 2),
+        'b/lights': np.random.rand(3, 3).T}
+    index, data = tmp_path / 'index.json', tmp_path / 'data.bin'
+    saved = mmapsave(flat, index, data)
+    loaded = mmapload(index, data)
+    assert sorted(p.name for p in tmp_path.iterdir()) == ['data.bin', 'index.json']
+
+    assert list(loaded) == list(flat)
+    for k, v in flat.items():
+        assert loaded[k].shape == v.shape
+        assert loaded[k].dtype == v.dtype
+        assert loaded[k].ctypes.data % ALIGNMENT == 0
+        np.testing.assert_array_equal(loaded[k], v)
+        np.testing.assert_array_equal(saved[k], v)
@@ -114,6 +114,8 @@ class Explorer:
 
         alpha = .1 + .9*state.seen.astype(float)
         # modifying this in place will bite me eventually. o for a lens
+        # texels are gamma-encoded bytes, so the alpha needs to be too
+        alpha = 255*core.gamma_encode(alpha)
         state.core.scenery.textures.vals = np.concatenate([state.core.scenery.textures.vals, alpha[:, None]], 1)
         ax = core.Core.plot_state(state.core, plt.subplot(gs[:, 0]))
 
@@ -74,7 +74,7 @@ def line_arrays(state):
     baked = scenery.baked.vals.copy()
     baked[:n_agent_texels(scenery)] = 1.
 
-    colors = core.gamma_encode(scenery.textures.vals*baked[:, None])
+    colors = core.gamma_encode(core.gamma_decode(scenery.textures.vals/255)*baked[:, None])
     return lines, colors
 
 def plot_lights(ax, state):
@@ -58,7 +58,10 @@ def Ragged(vals, widths):
     
     If you pass numpy arrays as arguments, you'll get back a :class:`RaggedNumpy` object; if you pass Torch tensors,
     you'll get back a :class:`cuda.Ragged$ND` that's backed by a C++
-    implementation and is OK to pass to the :class:`core.Core` machinery.
+    implementation and is OK to pass to the :class:`core.Core` machinery. 
+    
+    The Torch raggeds hold float32 values, except for uint8 tensors, which get a :class:`cuda.Ragged$NDU8`. That's
+    what :attr:`~megastep.cuda.Scenery.textures` is; in earlier versions it was float32.
 
     :param vals: a (V, ...)-array/tensor of backing values.
     :param widths: a (W,)-array/tensor of widths of each subarray in the ragged. The sum of the widths must equal ``V``.
@@ -71,7 +74,8 @@ def Ragged(vals, widths):
     """
     if isinstance(vals, np.ndarray):
         return RaggedNumpy(vals, widths)
-    Ragged = getattr(cuda, f'Ragged{vals.ndim}D')
+    suffix = 'U8' if vals.dtype == torch.uint8 else ''
+    Ragged = getattr(cuda, f'Ragged{vals.ndim}D{suffix}')
     return Ragged(vals, widths)
 
 def test_ragged():
@@ -20,7 +20,9 @@ COLORS = [
     "#5a728c"]
 
 def lengths(lines):
-    return ((lines[..., 0, :] - lines[..., 1, :])**2).sum(-1)**.5
+    # einsum squares-and-sums in one pass, without a temporary for the squares
+    d = lines[..., 0, :] - lines[..., 1, :]
+    return np.sqrt(np.einsum('...i,...i->...', d, d))
 
 def agent_model():
     corners = [
@@ -37,35 +39,49 @@ def agent_colors():
     colors = (k, g, k, r, k, r, k, g)
     return np.stack([mpl.colors.to_rgb(s) for s in colors])
 
+# These are constant, so parse the color strings once rather than every time they're needed. 
+_AGENT_COLORS = agent_colors()
+_COLORMAP = np.array([mpl.colors.to_rgb(c) for c in COLORS])
+
 def resolutions(lines):
-    return np.ceil(lengths(lines)/core.TEXTURE_RES).astype(int)
+    return np.ceil(lengths(lines)/core.TEXTURE_RES).astype(np.int32)
 
 def wall_pattern(n, l=.5, random=np.random):
     p = core.TEXTURE_RES/l
-    jumps = random.choice(np.array([0., 1.]), p=np.array([1-p, p]), size=n)
-    jumps = jumps*random.normal(size=n)
-    value = .5 + .5*(jumps.cumsum() % 1)
+    # `uniform` and `standard_normal` rather than `random`/`dtype=` so this works with RandomStates too
+    jumps = (random.uniform(size=n) < p)*random.standard_normal(n).astype(np.float32)
+    value = .5 + .5*(jumps.cumsum(dtype=np.float32) % 1)
     return value
 
 def init_textures(agentlines, agentcolors, walls, random=np.random):
-    colormap = np.array([mpl.colors.to_rgb(c) for c in COLORS])
-    wallcolors = colormap[np.arange(len(walls)) % len(colormap)]
-    colors = np.concatenate([agentcolors, wallcolors])
-
-    texwidths = resolutions(np.concatenate([agentlines, walls]))
-    starts = texwidths.cumsum() - texwidths
-
-    indices = np.full(texwidths.sum(), 0)
-    indices[starts] = 1
-    indices = np.cumsum(indices) - 1
-    textures = core.gamma_decode(colors[indices])
+    return init_textures_batch(agentlines, agentcolors, [walls], random)
+
+def init_textures_batch(agentlines, agentcolors, walls, random=np.random):
+    """Like :func:`init_textures`, but for a list of wall arrays - one per geometry - at once. The textures and
+    texture widths of each geometry are concatenated together, in the same way ``arrdict.cat`` would."""
+    # The same geometry is often passed many times over, so only work out the colors and widths of each 
+    # distinct wall array once.
+    distinct = {}
+    for w in walls:
+        if id(w) not in distinct:
+            wallcolors = _COLORMAP[np.arange(len(w)) % len(_COLORMAP)]
+            distinct[id(w)] = (
+                np.concatenate([agentcolors, wallcolors]),
+                resolutions(np.concatenate([agentlines, w])),
+                np.arange(len(agentlines) + len(w)) < len(agentlines))
+    colors, texwidths, isagent = (np.concatenate(xs) for xs in zip(*(distinct[id(w)] for w in walls)))
+
+    indices = np.repeat(np.arange(len(colors)), texwidths)
+    textures = core.gamma_decode(colors)[indices]
 
     # Gives walls an even pattern that makes depth perception easy
     pattern = wall_pattern(textures.shape[0], random=random)
-    pattern[:sum(texwidths[:len(agentlines)])] = 1.
-    textures = textures*pattern[:, None]
+    pattern[np.repeat(isagent, texwidths)] = 1.
+    np.multiply(textures, pattern[:, None], out=textures)
 
-    return textures, texwidths
+    # Stored as gamma-encoded bytes, so the quantization steps are spread evenly by perceived brightness rather than
+    # being coarse in the darks. The shader decodes them back to linear values.
+    return np.rint(255*core.gamma_encode(textures)).astype(np.uint8), texwidths
 
 def random_lights(lights, random=np.random):
     return np.concatenate([
@@ -74,19 +90,20 @@ def random_lights(lights, random=np.random):
 
 @torch.no_grad()
 def scenery(geometries, n_agents=1, device='cuda', random=np.random): 
-    agentlines = np.tile(agent_model(), (n_agents, 1, 1))
-    agentcolors = np.tile(agent_colors(), (n_agents, 1))
-
-    data = []
-    for g in geometries:
-        lights = random_lights(g.lights)
-        lines = np.concatenate([agentlines, g.walls])
-        textures, texwidths = init_textures(agentlines, agentcolors, g.walls, random) 
-        data.append(arrdict.arrdict(
-            lights=arrdict.arrdict(vals=lights, widths=len(lights)),
-            lines=arrdict.arrdict(vals=lines, widths=len(lines)),
-            textures=arrdict.arrdict(vals=textures, widths=texwidths)))
-    data = arrdict.torchify(arrdict.cat(data)).to(device)
+    model = agent_model()
+    agentlines = np.tile(model, (n_agents, 1, 1))
+    agentcolors = np.tile(_AGENT_COLORS, (n_agents, 1))
+
+    lights = [random_lights(g.lights) for g in geometries]
+    lines = [np.concatenate([agentlines, g.walls]) for g in geometries]
+    textures, texwidths = init_textures_batch(agentlines, agentcolors, [g.walls for g in geometries], random)
+    data = arrdict.torchify(arrdict.arrdict(
+        lights=arrdict.arrdict(vals=np.concatenate(lights), widths=np.array([len(l) for l in lights])),
+        lines=arrdict.arrdict(vals=np.concatenate(lines), widths=np.array([len(l) for l in lines])),
+        textures=arrdict.arrdict(widths=texwidths)))
+    # torchify would widen the texels to int32
+    data['textures']['vals'] = torch.as_tensor(textures)
+    data = data.to(device)
     
     lights = ragged.Ragged(**data['lights'])
     scenery = core.cuda.Scenery(
@@ -94,7 +111,7 @@ def scenery(geometries, n_agents=1, device='cuda', random=np.random):
         lights=lights,
         lines=ragged.Ragged(**data['lines']),
         textures=ragged.Ragged(**data['textures']),
-        model=arrdict.torchify(agent_model()).to(device))
+        model=arrdict.torchify(model).to(device))
     core.cuda.bake(scenery)
 
     return scenery
@@ -111,4 +128,32 @@ def display(scenery, e=0):
 
     plotting.adjust_view(ax, state, zoom=False)
 
-    return ax.figure
\ No newline at end of file
+    return ax.figure
+
+class _Flat:
+    # Stands in for np.random so that the wall pattern is a constant .5 
+
+    def uniform(self, size):
+        return np.ones(size)
+
+    def standard_normal(self, n):
+        return np.zeros(n)
+
+def test_init_textures_batch():
+    agentlines = np.tile(agent_model(), (2, 1, 1))
+    agentcolors = np.tile(_AGENT_COLORS, (2, 1))
+    a = np.array([[[0., 0.], [1., 0.]], [[1., 0.], [1., 2.]]])
+    b = np.array([[[0., 0.], [0., .5]]])
+    walls = [a, b, a]
+
+    textures, texwidths = init_textures_batch(agentlines, agentcolors, walls, _Flat())
+    singles = [init_textures(agentlines, agentcolors, w, _Flat()) for w in walls]
+    np.testing.assert_array_equal(texwidths, np.concatenate([w for _, w in singles]))
+    np.testing.assert_array_equal(textures, np.concatenate([t for t, _ in singles]))
+
+    # Agents are unpatterned; walls get the constant .5 pattern
+    colors = np.concatenate([agentcolors, _COLORMAP[np.arange(len(a)) % len(_COLORMAP)]])
+    pattern = np.where(np.arange(len(colors)) < len(agentlines), 1., .5)
+    expected = np.rint(255*core.gamma_encode(core.gamma_decode(colors)*pattern[:, None]))
+    widths = resolutions(np.concatenate([agentlines, a]))
+    np.testing.assert_array_equal(textures[:widths.sum()], np.repeat(expected, widths, 0))
@@ -178,7 +178,7 @@ struct Agents {
 
 using Lights = Ragged<float, 2>;
 using Lines = Ragged<float, 3>;
-using Textures = Ragged<float, 2>;
+using Textures = Ragged<uint8_t, 2>;
 using Baked = Ragged<float, 1>;
 using Model = TensorProxy<float, 3>;
 
@@ -192,10 +192,10 @@ struct Scenery {
 
     // Weird initialization of `baked` here is to avoid having to create a `AutoNonVariableTypeMode` 
     // guard, because I still don't understand the Variable vs Tensor thing. 
-    // Goal is to create a Tensor of 1s like textures.vals[:, 0]
+    // Goal is to create a float Tensor of 1s like textures.vals[:, 0]
     Scenery(int n_agents, Lights lights, Lines lines, Textures textures, TT model) :
         n_agents(n_agents), lights(lights), lines(lines), textures(textures), model(model),
-        baked(at::ones_like(textures.vals.select(1, 0)), textures.widths) {
+        baked(at::ones_like(textures.vals.select(1, 0), textures.vals.options().dtype(at::kFloat)), textures.widths) {
     }
 
     py::object state(const size_t e) {
@@ -14,6 +14,7 @@ float FPS;
 __constant__ float FPS_;
 __constant__ float AGENT_RADIUS;
 __constant__ float HALF_SCREEN_WIDTH;
+__constant__ float TEXEL_DECODE[256];
 
 __host__ void initialize(float agent_radius, int res, float fov, float fps) {
     RES = res;
@@ -24,6 +25,13 @@ __host__ void initialize(float agent_radius, int res, float fov, float fps) {
 
     FPS = fps;
     cudaMemcpyToSymbol(FPS_, &fps, sizeof(float));
+
+    // Lookup table from gamma-encoded texel bytes to linear values in [0, 1]
+    float decode[256];
+    for (int i = 0; i < 256; ++i) {
+        decode[i] = powf(i/255.f, 2.2f);
+    }
+    cudaMemcpyToSymbol(TEXEL_DECODE, decode, sizeof(decode));
 }
 
 
@@ -404,6 +412,11 @@ __device__ Filter filter(float x, int w) {
     return {l, r, lw, rw};
 }
 
+// Texels are stored as gamma-encoded bytes, so this looks up their linear values
+__device__ inline float texel(const uint8_t b) {
+    return TEXEL_DECODE[b];
+}
+
 __global__ void shader_kernel(
     Indices::PTA indices, Locations::PTA locations, Dots::PTA dots,
     Lines::PTA lines, Lights::PTA lights, Textures::PTA textures, Baked::PTA baked, int F,
@@ -440,9 +453,9 @@ __global__ void shader_kernel(
 
         // `dots` is the dot with the line; we want the dot with the normal
         const auto dot = 1 - dots[n][a][r]*dots[n][a][r];
-        s0 = dot*intensity*(f.lw*tex_l[0] + f.rw*tex_r[0]);
-        s1 = dot*intensity*(f.lw*tex_l[1] + f.rw*tex_r[1]);
-        s2 = dot*intensity*(f.lw*tex_l[2] + f.rw*tex_r[2]);
+        s0 = dot*intensity*(f.lw*texel(tex_l[0]) + f.rw*texel(tex_r[0]));
+        s1 = dot*intensity*(f.lw*texel(tex_l[1]) + f.rw*texel(tex_r[1]));
+        s2 = dot*intensity*(f.lw*texel(tex_l[2]) + f.rw*texel(tex_r[2]));
     }
     screen[n][a][r][0] = s0;
     screen[n][a][r][1] = s1;
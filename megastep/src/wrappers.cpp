@@ -99,6 +99,7 @@ PYBIND11_MODULE(TORCH_EXTENSION_NAME, m) {
     ragged<Ragged<float, 1>>(m, "Ragged1D");
     ragged<Ragged<float, 2>>(m, "Ragged2D");
     ragged<Ragged<float, 3>>(m, "Ragged3D");
+    ragged<Ragged<uint8_t, 2>>(m, "Ragged2DU8");
 
     py::class_<Agents>(m, "Agents", py::module_local())
         .def(py::init<TT, TT, TT, TT>(),
@@ -140,7 +141,12 @@ PYBIND11_MODULE(TORCH_EXTENSION_NAME, m) {
         .def_readonly("lines", &Scenery::lines, R"pbdoc(
             An (n_lines, 2, 2)-:class:`~megastep.ragged.Ragged` tensor giving the lines in each scenery.)pbdoc")
         .def_readonly("textures", &Scenery::textures, R"pbdoc(
-            An (n_texels, 3)-:class:`~megastep.ragged.Ragged` tensor giving the texels in each line.)pbdoc")
+            An (n_texels, 3)-:class:`~megastep.ragged.Ragged` uint8 tensor giving the texels in each line. Colours are
+            gamma-encoded RGB, scaled from [0, 1] to [0, 255]. 
+            
+            This is a breaking change from earlier versions, where the texels were float32 linear RGB in [0, 1]. Code
+            that builds or edits textures as floats needs to convert them with 
+            ``(255*gamma_encode(x)).round().to(torch.uint8)``.)pbdoc")
         .def_readonly("baked", &Scenery::baked, R"pbdoc(
             An (n_texels,)-:class:`~megastep.ragged.Ragged` tensor giving the :func:`bake`-d illumination of each texel.)pbdoc");
 
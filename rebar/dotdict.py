@@ -173,6 +173,13 @@ def starmapping(f):
 
 def leaves(t):
     """Returns the leaves of a tree of dotdicts as a list"""
-    if isinstance(t, dict):
-        return [l for v in t.values() for l in leaves(v)]
-    return [t]
\ No newline at end of file
+    # A single walk with a stack, rather than building and copying a list at every level of the tree. Children are 
+    # pushed in reverse so the leaves come out in their usual order.
+    ls, stack = [], [t]
+    while stack:
+        v = stack.pop()
+        if isinstance(v, dict):
+            stack.extend(reversed(list(v.values())))
+        else:
+            ls.append(v)
+    return ls
\ No newline at end of file
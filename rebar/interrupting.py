@@ -5,6 +5,7 @@ import logging
 log = logging.getLogger(__name__)
 
 class Interrupter:
+    __slots__ = ('_is_set',)
 
     def __init__(self):
         self._is_set = False
@@ -25,9 +26,13 @@ _INTERRUPTER = Interrupter()
 
 @maybeasynccontextmanager
 def interrupter():
-    old = signal.signal(signal.SIGINT, _INTERRUPTER.handle)
+    # If we're nested inside another interrupter, the handler's already in place
+    old = signal.getsignal(signal.SIGINT)
+    if old != _INTERRUPTER.handle:
+        signal.signal(signal.SIGINT, _INTERRUPTER.handle)
     try:
         yield _INTERRUPTER
     finally:
         _INTERRUPTER.reset()
-        signal.signal(signal.SIGINT, old)
\ No newline at end of file
+        if old != _INTERRUPTER.handle:
+            signal.signal(signal.SIGINT, old)
\ No newline at end of file
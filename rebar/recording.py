@@ -9,7 +9,6 @@ import matplotlib.pyplot as plt
 from tqdm.auto import tqdm
 from .parallel import parallel
 import logging
-import time
 import multiprocessing
 from matplotlib import tight_bbox
 import numbers
@@ -185,20 +184,19 @@ class ParallelEncoder:
         self._submit = self._pool.__enter__()
         return self
 
+    def _encode_next(self):
+        # Frames have to be encoded in order, so this blocks on the oldest outstanding one
+        result = self._futures.pop(self._contiguous).result()
+        self._encoder(result)
+        self._contiguous += 1
+
     def _process_done(self):
-        while True:
-            if (self._contiguous in self._futures) and self._futures[self._contiguous].done():
-                result = self._futures[self._contiguous].result()
-                self._encoder(result)
-                del self._futures[self._contiguous]
-                self._contiguous += 1
-            else:
-                break
+        while (self._contiguous in self._futures) and self._futures[self._contiguous].done():
+            self._encode_next()
 
     def _wait(self):
         while self._futures:
-            self._process_done()
-            time.sleep(.01)
+            self._encode_next()
 
     def __exit__(self, t, v, tb):
         self._wait()
@@ -207,7 +205,7 @@ class ParallelEncoder:
 
     def __call__(self, *args, **kwargs):
         while len(self._futures) > self._queuelen:
-            self._process_done()
+            self._encode_next()
 
         self._futures[self._submitted] = self._submit(self._f, *args, **kwargs)
         self._submitted += 1